@@ -1,10 +1,3 @@
-import ifcopenshell
-import ifcopenshell.geom
-import os
-import math
-import numpy as np
-import re
-
 """
 BR18 Building Code Compliance Checker
 ======================================
@@ -24,15 +17,25 @@ Reference: BR18.pdf included in this folder
 # SECTION 1: IMPORTS AND CONFIGURATION
 # ============================================================================
 
+import io
 import os
 import sys
-import math
+import weakref
 import re as _re
+from array import array
+from collections import defaultdict, deque, namedtuple
+from itertools import chain
+from dataclasses import dataclass
+from typing import Optional
 import numpy as np
 import ifcopenshell
 import ifcopenshell.geom
 
-# Configuration Constants
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; NumPy broadcasting is used instead
+    njit = None
+
 # Configuration Constants
 IFC_PATH = os.path.join(os.path.dirname(__file__), "model", "25-16-D-ARCH.ifc")
 DOOR_MIN = 800  # Minimum door width in mm
@@ -40,6 +43,14 @@ STAIR_MIN = 1000  # Minimum stair width in mm
 CORRIDOR_MIN = 1300  # Minimum corridor width in mm
 BUFFER_BBOX = 1000.0  # Buffer for bounding box calculations
 NEAREST_MAX = 30000.0  # Maximum distance for proximity checks
+LAZY_OPEN_BYTES = 200 * 1024 * 1024  # Above this file size, parse instances lazily on first access
+# Name tokens that identify corridor/hallway spaces, matched in one regex scan
+HALLWAY_TOKENS = ('hallway', 'corridor', 'passage', 'circulation')
+_CORRIDOR_RE = _re.compile('|'.join(HALLWAY_TOKENS), _re.IGNORECASE)
+GEOM_THREADS = os.cpu_count() or 1  # Threads for the batched geom.iterator tessellation pass
+
+# Representation identifiers that carry the solid body (Axis, FootPrint, CoG, ... are skipped)
+BODY_REP_IDS = (None, 'Body')
 
 # Geometry settings for IFC shape extraction
 GEOM_SETTINGS = ifcopenshell.geom.settings()
@@ -51,45 +62,133 @@ GEOM_SETTINGS.set(GEOM_SETTINGS.USE_WORLD_COORDS, True)
 # ============================================================================
 
 # Performance optimization: Cache for storing computed bounding boxes
-# Key: (entity_type, GlobalId), Value: (xmin, ymin, xmax, ymax) in mm
+# Key: (model file pointer, entity_type, GlobalId), Value: (xmin, ymin, xmax, ymax) in mm
 # This avoids expensive geometry recalculation when checking the same element multiple times
 _BBOX_CACHE = {}
 
+# Cache for element centroids (same key scheme as _BBOX_CACHE, value in mm or None).
+# Openings are centroided by both build_space_linkages and build_full_door_space_map,
+# so each opening only needs to be tessellated once per model.
+_CENTROID_CACHE = {}
 
-def to_mm(v):
-    """Convert a dimension value to millimeters.
+# Raw world-coordinate vertices (metres, (N, 3)) per element, same key scheme, or None
+# when the element has no geometry. Filled up front by prefetch_vertices and by
+# get_vertices for anything the prefetch did not cover.
+_VERTS_CACHE = {}
+
+# Models the caches are tracking: model file pointer -> weakref.finalize handle.
+# Every cache key starts with the model's file pointer, and a model's entries are
+# dropped when it is freed, so results never leak between models (GlobalIds and
+# STEP ids can repeat across files, and a freed model's address can be reused).
+_MODELS = {}
+
+
+def _register_model(model):
+    """Start tracking model's cache lifetime (once) and return its file pointer."""
+    ptr = model.file_pointer()
+    if ptr not in _MODELS:
+        _MODELS[ptr] = weakref.finalize(model, _forget_model, ptr)
+    return ptr
+
+
+def _forget_model(ptr):
+    """Drop every cache entry of the model at file pointer ptr."""
+    _MODELS.pop(ptr, None)
+    for cache in (_BBOX_CACHE, _CENTROID_CACHE, _VERTS_CACHE, _BY_TYPE_CACHE,
+                  _PSET_CACHE, _PDEF_ITEMS, _NUMERIC_CACHE):
+        for k in [k for k in cache if k[0] == ptr]:
+            del cache[k]
+
+
+def _key(x):
+    """Stable dict key for an IFC element: its GlobalId, or the object id as an int.
+
+    The int fallback avoids a str() allocation per call; it cannot collide with a
+    GlobalId because the two key types never compare equal.
+    """
+    g = getattr(x, 'GlobalId', None)
+    return g if g else id(x)
+
+
+def _cache_key(entity):
+    """Return the (model file pointer, entity_type, GlobalId) key used by the entity caches, or None.
+
+    None (not cached) for non-IFC objects and for entities of a model that was never
+    registered with _register_model, since their cache lifetime cannot be tracked.
+    """
+    try:
+        ptr = entity.file_pointer()
+        if ptr not in _MODELS:
+            return None
+        return (ptr, entity.is_a(), _key(entity))
+    except Exception:
+        return None
+
+
+# Cache for model.by_type() results, keyed by (model file pointer, type name).
+# IfcStairFlight, IfcSpace and the wall/relation types are queried by several
+# analysis functions; each distinct query is only run once per model.
+_BY_TYPE_CACHE = {}
+
+
+def _by_type(model, type_name):
+    """Cached model.by_type(type_name); returns a tuple of entities.
+
+    Also registers the model, so its entities are cached from here on.
+    """
+    key = (_register_model(model), type_name)
+    ents = _BY_TYPE_CACHE.get(key)
+    if ents is None:
+        ents = _BY_TYPE_CACHE[key] = tuple(model.by_type(type_name))
+    return ents
+
+
+def _num(v):
+    """Return v as a float, or None if it is not numeric.
+
+    IFC attribute values are usually already Python floats, so check the type
+    before falling back to float() inside a try/except.
     """
+    if v.__class__ is float:
+        return v
+    if isinstance(v, (int, float)):
+        return float(v)
+    if v is None:
+        return None
     try:
-        f = float(v)
+        return float(v)
     except Exception:
         return None
+
+
+def to_mm(v):
+    """Convert a dimension value to millimeters.
+    """
+    f = _num(v)
+    if f is None:
+        return None
     return f if f > 100 else f * 1000.0
 
 
+def _to_mm_arr(a):
+    """Array form of to_mm: the same > 100 unit rule applied to every element with one np.where."""
+    return np.where(a > 100, a, a * 1000.0)
+
+
 # ============================================================================
 # SECTION 3: GEOMETRY EXTRACTION FUNCTIONS
 # ============================================================================
 
-def extract_dimensions_from_geometry(sp):
-    """Extract width and length from IfcSpace geometry using 3D vertices.
-    """
-    try:
-        verts = get_vertices(sp)
-        if verts is not None and len(verts) > 0:
-            # Convert from meters to millimeters (multiply by 1000)
-            verts = verts * 1000.0
-            minv = verts.min(axis=0)
-            maxv = verts.max(axis=0)
-            dims = maxv - minv
-            # Return (longer dim, shorter dim) as (length, width)
-            dim_sorted = sorted(dims[:2])  # Take X, Y (ignore Z height)
-            if dim_sorted[1] > 0:  # Ensure width > 0
-                return dim_sorted[1], dim_sorted[0]
-    except Exception:
-        pass
-    
-    return 0, 0
+def _verts_array(geometry):
+    """(N, 3) float64 view of a shape's vertices.
 
+    Reads the raw verts_buffer bytes when available (no per-float Python objects);
+    older ifcopenshell builds only expose the verts tuple.
+    """
+    buf = getattr(geometry, 'verts_buffer', None)
+    if buf is not None:
+        return np.frombuffer(buf, dtype=np.float64).reshape(-1, 3)
+    return np.array(geometry.verts, dtype=float).reshape(-1, 3)
 
 
 def get_vertices(product):
@@ -98,237 +197,479 @@ def get_vertices(product):
     This function attempts to create a 3D shape from the IFC element and
     extract all its vertex coordinates using world (absolute) coordinates.
     """
+    key = _cache_key(product)
+    if key is not None and key in _VERTS_CACHE:
+        return _VERTS_CACHE[key]
     try:
         shape = ifcopenshell.geom.create_shape(GEOM_SETTINGS, product)
-        verts = np.array(shape.geometry.verts, dtype=float).reshape(-1, 3)
-        return verts
+        verts = _verts_array(shape.geometry)
     except (KeyboardInterrupt, Exception):
         # Return None for any geometry error (includes timeouts/interrupts)
-        return None
+        verts = None
+    # Failures are cached too, so an element without geometry is only tried once
+    if key is not None:
+        _VERTS_CACHE[key] = verts
+    return verts
+
+
+def prefetch_vertices(model, products):
+    """Tessellate products in one multi-threaded geom.iterator pass and fill _VERTS_CACHE.
+
+    Anything the iterator skips or fails on is still tessellated on demand by get_vertices.
+    """
+    _register_model(model)
+    keys = {}
+    include = []
+    for p in products:
+        k = _cache_key(p)
+        if k is not None and p.id() not in keys:
+            keys[p.id()] = k
+            include.append(p)
+    by_id = {p.id(): p for p in include}
+    if not include:
+        return
+    try:
+        it = ifcopenshell.geom.iterator(GEOM_SETTINGS, model, GEOM_THREADS, include=include)
+        ok = it.initialize()
+    except RuntimeError as e:  # geometry kernel could not set up the iterator
+        print(f"Warning: geometry prefetch unavailable, tessellating per element ({e})")
+        return
+    if not ok:
+        return
+    filled = []
+    while True:
+        shape = it.get()
+        k = keys.get(shape.id)
+        if k is not None:
+            _VERTS_CACHE[k] = _verts_array(shape.geometry)
+            filled.append(shape.id)
+        if not it.next():
+            break
+    # Spot-check the first prefetched element against create_shape; if the iterator
+    # disagrees (settings or units), drop the prefetch rather than mix both sources.
+    if filled and not _prefetch_matches(by_id[filled[0]], _VERTS_CACHE[keys[filled[0]]]):
+        print("Warning: geometry prefetch disagrees with create_shape, tessellating per element")
+        for sid in filled:
+            _VERTS_CACHE.pop(keys[sid], None)
+
+
+def _prefetch_matches(product, verts):
+    """True if verts (from geom.iterator) has the same count, extents and mean as create_shape."""
+    try:
+        ref = _verts_array(ifcopenshell.geom.create_shape(GEOM_SETTINGS, product).geometry)
+    except RuntimeError:
+        return True  # create_shape cannot build it either; the iterator result is all there is
+    if ref.shape != verts.shape:
+        return False
+    return (np.allclose(ref.min(axis=0), verts.min(axis=0)) and np.allclose(ref.max(axis=0), verts.max(axis=0))
+            and np.allclose(ref.mean(axis=0), verts.mean(axis=0)))
 
 
 # ============================================================================
 # SECTION 4: PROPERTY EXTRACTION FUNCTIONS
 # ============================================================================
 
+# Name matchers for get_numeric, keyed by the names tuple as passed by the caller:
+# (compiled substring alternation, frozenset of lowercase names for exact matches).
+# Built once per call site, so get_numeric never re-lowercases its name list.
+_SUBSTR_PATTERNS = {}
+
+# Property name lists passed to get_numeric (module constants, so no list is built per call)
+DOOR_WIDTH_NAMES = ('overallwidth', 'width', 'doorwidth')
+STAIR_WIDTH_NAMES = ('actual run width', 'actualrunwidth', 'run width', 'width', 'tread')
+AREA_NAMES = ('area',)
+PERIMETER_NAMES = ('perimeter',)
+
+
+def _name_matchers(names):
+    key = names if type(names) is tuple else tuple(names)
+    m = _SUBSTR_PATTERNS.get(key)
+    if m is None:
+        names_l = [n.lower() for n in key]
+        m = _SUBSTR_PATTERNS.setdefault(key, (_re.compile('|'.join(map(_re.escape, names_l))), frozenset(names_l)))
+    return m
+
+
+# Flattened numeric property/quantity values per entity: _cache_key -> ((lowercase name, value in mm), ...)
+_PSET_CACHE = {}
+
+
+# Lowercased property names, interned: the same few names ('Width', 'Area', ...)
+# repeat across every pset in the model, so each distinct string is lowered once.
+_LOWER_NAMES = {}
+
+
+def _lower(name):
+    l = _LOWER_NAMES.get(name)
+    if l is None:
+        l = _LOWER_NAMES[name] = sys.intern(name.lower())
+    return l
+
+
+# Flattened numeric values per property definition: (model file pointer, STEP id) -> ((lowercase name, mm), ...)
+_PDEF_ITEMS = {}
+
+
+def _pdef_items(pdef):
+    """(lowercase name, mm) pairs for the usable values of one property definition.
+
+    Same kinds as the original IsDefinedBy walk: IfcPropertySet entries with a
+    NominalValue, and Length/Area/Volume quantities of an IfcElementQuantity, in
+    their declared order. Values that are not usable (non-numeric or zero) are dropped.
+    """
+    # STEP ids are only unique within one file, so the key includes the model
+    key = (pdef.file_pointer(), pdef.id())
+    items = _PDEF_ITEMS.get(key)
+    if items is not None:
+        return items
+    items = []
+    if pdef.is_a('IfcPropertySet'):
+        for p in pdef.HasProperties or ():
+            nv = getattr(p, 'NominalValue', None)
+            if nv is not None:
+                r = to_mm(getattr(nv, 'wrappedValue', nv))
+                if r:
+                    items.append((_lower(p.Name or ''), r))
+    elif pdef.is_a('IfcElementQuantity'):
+        for q in pdef.Quantities or ():
+            r = to_mm(getattr(q, 'LengthValue', None) or getattr(q, 'AreaValue', None) or getattr(q, 'VolumeValue', None))
+            if r:
+                items.append((_lower(q.Name or ''), r))
+    items = tuple(items)
+    if key[0] in _MODELS:
+        _PDEF_ITEMS[key] = items
+    return items
+
+
+def _flat_psets(entity):
+    """Return the entity's own numeric pset and qto values as (lowercase name, mm) pairs.
+
+    Walks IsDefinedBy once per entity, in relation order, so get_numeric's first
+    match is the same property the per-call walk used to return. Each property
+    definition is flattened once (_PDEF_ITEMS), however many objects share it.
+    """
+    k = _cache_key(entity)
+    items = _PSET_CACHE.get(k) if k is not None else None
+    if items is None:
+        items = []
+        for rel in getattr(entity, 'IsDefinedBy', None) or ():
+            if not rel.is_a('IfcRelDefinesByProperties'):
+                continue
+            pdef = rel.RelatingPropertyDefinition
+            # IFC4 IfcPropertySetDefinitionSet arrives as a tuple; the original walk skipped it
+            if pdef is None or isinstance(pdef, tuple):
+                continue
+            items.extend(_pdef_items(pdef))
+        items = tuple(items)
+        if k is not None:
+            _PSET_CACHE[k] = items
+    return items
+
+
+def build_props_index(model):
+    """Flatten every property definition in the model once, up front.
+
+    One pass over IfcRelDefinesByProperties fills _PDEF_ITEMS; _flat_psets then
+    only concatenates the prebuilt items in each entity's IsDefinedBy order.
+    """
+    for rel in _by_type(model, 'IfcRelDefinesByProperties'):
+        pdef = getattr(rel, 'RelatingPropertyDefinition', None)
+        if pdef is not None and not isinstance(pdef, tuple):
+            _pdef_items(pdef)
+
+
 # NOTE: get_bbox and get_door_midpoint were removed because the code
 # now uses `get_vertices` + geometry-based centroids via
 # `get_element_centroid`. They were unused and are deleted to keep
 # the file clean.
 
+# Memoized get_numeric results: _cache_key(entity) + (names tuple,) -> value in mm or None
+_NUMERIC_CACHE = {}
+
+
 def get_numeric(entity, names):
     """Extract a numeric property value from an IFC entity by searching multiple possible property names.
+
+    Results (including misses) are memoized per entity and name list.
     """
-    names_l = [n.lower() for n in names]
+    if type(names) is not tuple:
+        names = tuple(names)
+    ck = _cache_key(entity)
+    key = ck + (names,) if ck is not None else None
+    if key is not None and key in _NUMERIC_CACHE:
+        return _NUMERIC_CACHE[key]
+    r = _get_numeric_uncached(entity, names)
+    if key is not None:
+        _NUMERIC_CACHE[key] = r
+    return r
+
+
+# Direct IFC attribute names matching a name list: (schema-qualified IFC class, names tuple) -> attribute names
+_DIRECT_ATTRS = {}
+
+
+def _direct_attrs(entity, names, names_set):
+    """Attribute names of entity's class whose lowercase form is in names_set (sorted, like dir()).
+
+    Resolved once per class from the schema attribute list instead of a dir() scan per call.
+    The class name is schema-qualified (e.g. 'IFC4.IfcWall'): attribute lists differ
+    between IFC2X3 and IFC4.
+    """
+    is_a = getattr(entity, 'is_a', None)
+    if is_a is None:
+        return ()
+    key = (is_a(True), names)
+    attrs = _DIRECT_ATTRS.get(key)
+    if attrs is None:
+        attrs = tuple(sorted(a for a in map(entity.attribute_name, range(len(entity))) if a.lower() in names_set))
+        _DIRECT_ATTRS[key] = attrs
+    return attrs
+
+
+def _get_numeric_uncached(entity, names):
+    name_pat, names_set = _name_matchers(names)
     
-    # Step 1: Check direct attributes on the entity (e.g., entity.Width)
-    for attr in dir(entity):
-        try:
-            if attr.lower() in names_l:
-                v = getattr(entity, attr)
-                r = to_mm(v)
-                if r:
-                    return r
-        except Exception:
-            continue
+    # Step 1: Check direct attributes on the entity (e.g., entity.OverallWidth)
+    for attr in _direct_attrs(entity, names, names_set):
+        r = to_mm(getattr(entity, attr, None))
+        if r:
+            return r
     
-    # Step 2 & 3: Check property sets and quantity sets via IsDefinedBy relationships
-    for rel in getattr(entity, 'IsDefinedBy', []) or []:
-        try:
-            if not rel.is_a('IfcRelDefinesByProperties'):
-                continue
-            pdef = rel.RelatingPropertyDefinition
-            if pdef is None:
-                continue
-            if pdef.is_a('IfcPropertySet'):
-                for p in getattr(pdef, 'HasProperties', []) or []:
-                    try:
-                        pname = (getattr(p, 'Name', '') or '').lower()
-                        if any(n in pname for n in names_l):
-                            if hasattr(p, 'NominalValue') and p.NominalValue is not None:
-                                try:
-                                    val = p.NominalValue.wrappedValue
-                                except Exception:
-                                    val = p.NominalValue
-                                r = to_mm(val)
-                                if r:
-                                    return r
-                    except Exception:
-                        continue
-            if pdef.is_a('IfcElementQuantity'):
-                for q in getattr(pdef, 'Quantities', []) or []:
-                    try:
-                        qn = (getattr(q, 'Name', '') or '').lower()
-                        if any(n in qn for n in names_l):
-                            val = getattr(q, 'LengthValue', None) or getattr(q, 'AreaValue', None) or getattr(q, 'VolumeValue', None)
-                            r = to_mm(val)
-                            if r:
-                                return r
-                    except Exception:
-                        continue
-        except Exception:
-            continue
+    # Step 2 & 3: Check property sets and quantity sets (flattened once per entity)
+    for pname, r in _flat_psets(entity):
+        if name_pat.search(pname):
+            return r
     return None
 
 
-def centroid_from_extruded(item):
-    try:
-        if not item or not item.is_a('IfcExtrudedAreaSolid'):
-            return None
-        pos = getattr(item, 'Position', None)
-        loc = getattr(pos, 'Location', None) if pos else None
-        coords = list(getattr(loc, 'Coordinates', [])) if loc else []
-        x = float(coords[0]) if coords else 0.0
-        y = float(coords[1]) if len(coords) > 1 else 0.0
-        z = float(coords[2]) if len(coords) > 2 else 0.0
-        # Convert location coords to mm (they come in meters or model units)
-        x = x if x > 100 else x * 1000.0
-        y = y if y > 100 else y * 1000.0
-        z = z if z > 100 else z * 1000.0
-        prof = getattr(item, 'SweptArea', None)
+def iter_extruded_solids(elem):
+    """Yield the IfcExtrudedAreaSolid items of elem's Body representation(s).
+
+    Representation is read once; other representations (Axis, FootPrint, ...) are skipped.
+    """
+    prod_rep = getattr(elem, 'Representation', None)
+    if prod_rep is None:
+        return
+    for rep in prod_rep.Representations:
+        if rep.RepresentationIdentifier not in BODY_REP_IDS:
+            continue
+        for it in rep.Items:
+            if it.is_a('IfcExtrudedAreaSolid'):
+                yield it
+
+
+def body_rect_profiles(elem):
+    """Return raw (XDim, YDim) of every rectangle-profile extrusion in elem's Body representation.
+
+    One walk of Representation -> Items -> SweptArea shared by the door and stair
+    width fallbacks; unit scaling is left to the caller.
+    """
+    dims = []
+    for it in iter_extruded_solids(elem):
+        prof = getattr(it, 'SweptArea', None)
         if prof and prof.is_a('IfcRectangleProfileDef'):
-            xd = float(getattr(prof, 'XDim', 0) or 0)
-            yd = float(getattr(prof, 'YDim', 0) or 0)
-            xd = xd if xd > 100 else xd * 1000.0
-            yd = yd if yd > 100 else yd * 1000.0
-            return (x + xd / 2.0, y + yd / 2.0, z + float(getattr(item, 'Height', 0)) / 2.0)
-        return (x, y, z)
-    except Exception:
-        return None
+            dims.append((getattr(prof, 'XDim', None), getattr(prof, 'YDim', None)))
+    return dims
 
 
 def get_element_centroid(elem):
-    """Get centroid using ifcopenshell.geom (same method as debug script)."""
+    """Get centroid using ifcopenshell.geom (same method as debug script).
+
+    Results (including failures) are memoized in _CENTROID_CACHE.
+    """
+    key = _cache_key(elem)
+    if key and key in _CENTROID_CACHE:
+        return _CENTROID_CACHE[key]
+    c = None
     try:
         verts = get_vertices(elem)
         if verts is not None and len(verts) > 0:
-            verts = verts * 1000.0  # Convert to mm
-            return verts.mean(axis=0)
+            # Average in metres and scale the 3-vector to mm (no scaled copy of the
+            # cached, read-only vertex array)
+            c = verts.mean(axis=0) * 1000.0
     except Exception:
         pass
-    return None
+    if key:
+        _CENTROID_CACHE[key] = c
+    return c
 
 
 # ============================================================================
 # SECTION 5: SPACE CONNECTIVITY AND LINKAGE ANALYSIS
 # ============================================================================
 
-def build_space_bboxes(spaces):
-    b = {}
-    for sp in spaces:
-        sid = getattr(sp, 'GlobalId', None) or str(id(sp))
-        xmin = ymin = float('inf'); xmax = ymax = float('-inf')
-        if getattr(sp, 'Representation', None):
-            for rep in sp.Representation.Representations:
-                for it in getattr(rep, 'Items', []) or []:
-                    if it.is_a('IfcExtrudedAreaSolid'):
-                        pos = getattr(it, 'Position', None)
-                        loc = getattr(pos, 'Location', None) if pos else None
-                        coords = list(getattr(loc, 'Coordinates', [])) if loc else []
-                        x = float(coords[0]) if coords else 0.0
-                        y = float(coords[1]) if len(coords) > 1 else 0.0
-                        prof = getattr(it, 'SweptArea', None)
-                        if prof and prof.is_a('IfcRectangleProfileDef'):
-                            xd = float(getattr(prof, 'XDim', 0) or 0)
-                            yd = float(getattr(prof, 'YDim', 0) or 0)
-                            xd = xd if xd > 100 else xd * 1000.0
-                            yd = yd if yd > 100 else yd * 1000.0
-                            hx = xd / 2.0; hy = yd / 2.0
-                            xmin = min(xmin, x - hx); ymin = min(ymin, y - hy)
-                            xmax = max(xmax, x + hx); ymax = max(ymax, y + hy)
-        b[sid] = (xmin, ymin, xmax, ymax) if xmin != float('inf') else None
-    return b
-
-
-def build_space_linkages(model, spaces):
+# Door -> spaces maps hold small values: most doors touch one or two spaces.
+# Values are stored as a bare key (1 space), a 2-tuple (2 spaces) and only
+# promoted to a set from the third distinct space on.
+
+def _add_small(d, k, v):
+    """Add v to the small-set value stored under d[k]."""
+    cur = d.get(k)
+    if cur is None:
+        d[k] = v
+    elif isinstance(cur, set):
+        cur.add(v)
+    elif isinstance(cur, tuple):
+        if v not in cur:
+            d[k] = {cur[0], cur[1], v}
+    elif cur != v:
+        d[k] = (cur, v)
+
+
+def _iter_small(val):
+    """Iterate the members of a small-set value written by _add_small."""
+    if val is None:
+        return ()
+    if isinstance(val, (set, tuple)):
+        return val
+    return (val,)
+
+
+def _space_kind(name_l):
+    """Classify a lowercase space name for the linkage graph: 'stair', 'hallway' or None."""
+    if 'stair' in name_l:
+        return 'stair'
+    if 'hallway' in name_l:
+        return 'hallway'
+    return None
+
+
+def build_door_fill_index(model):
+    """Walk IfcRelVoidsElement, IfcRelFillsElement and IfcRelSpaceBoundary once for both linkage builders.
+
+    Returns a dict with:
+        'opening_container_types': {opening STEP id: [IFC types of containing elements (walls etc.)]}
+        'door_fills': [(door, opening), ...] for every door filling an opening
+        'door_to_opening': {door STEP id: opening}
+        'door_boundaries': [(door STEP id, space STEP id), ...] from IfcRelSpaceBoundary
+    """
+    opening_container_types = {}
+    for relv in _by_type(model, 'IfcRelVoidsElement'):
+        container = getattr(relv, 'RelatingBuildingElement', None)
+        opening = getattr(relv, 'RelatedOpeningElement', None)
+        if not opening:
+            continue
+        if container is not None:
+            opening_container_types.setdefault(opening.id(), []).append(container.is_a())
+
+    door_fills = []
+    door_to_opening = {}
+    for rel in _by_type(model, 'IfcRelFillsElement'):
+        opening = getattr(rel, 'RelatingOpeningElement', None)
+        door = getattr(rel, 'RelatedBuildingElement', None)
+        if not (opening and door and door.is_a('IfcDoor')):
+            continue
+        door_fills.append((door, opening))
+        door_to_opening[door.id()] = opening
+
+    # Space boundaries whose related element is a door (walked once, outer try only)
+    door_boundaries = []
+    try:
+        for rb in _by_type(model, 'IfcRelSpaceBoundary'):
+            sp = getattr(rb, 'RelatingSpace', None)
+            be = getattr(rb, 'RelatedBuildingElement', None)
+            if sp and be and be.is_a('IfcDoor'):
+                door_boundaries.append((be.id(), sp.id()))
+    except Exception:
+        pass
+
+    return {'opening_container_types': opening_container_types, 'door_fills': door_fills,
+            'door_to_opening': door_to_opening, 'door_boundaries': door_boundaries}
+
+
+def build_space_linkages(model, spaces, door_index=None, space_kinds=None):
     """Check if hallways connect to stair spaces via doors.
     Note:
         A hallway that connects to another hallway that connects to stairs is also linked.
+        space_kinds ({space id: 'stair' | 'hallway' | None}) can be passed when the
+        caller has already classified the spaces by name.
     """
     # Identify stair and hallway spaces
     stair_spaces = {}
     hallway_spaces = {}
 
     spaces_list = list(spaces)
+    if space_kinds is None:
+        space_kinds = {sp.id(): _space_kind((getattr(sp, 'Name', None) or '').lower()) for sp in spaces_list}
     for sp in spaces_list:
-        sid = getattr(sp, 'GlobalId', None) or str(id(sp))
-        name = (getattr(sp, 'Name', None) or '').lower()
-        if 'stair' in name:
+        sid = sp.id()
+        kind = space_kinds.get(sid)
+        if kind == 'stair':
             stair_spaces[sid] = sp
-        elif 'hallway' in name:
+        elif kind == 'hallway':
             hallway_spaces[sid] = sp
 
-    # Build adjacency map between spaces (space_gid -> set(space_gid)) using doors
-    adjacency = { (getattr(sp, 'GlobalId', None) or str(id(sp))): set() for sp in spaces_list }
+    # Build adjacency map between spaces (space id -> set(space id)) using doors,
+    # filled incrementally as each door is resolved
+    adjacency = defaultdict(set)
 
-    # Build helper map: opening_gid -> list of containing elements (walls etc.)
-    opening_to_containers = {}
-    for relv in model.by_type('IfcRelVoidsElement'):
-        container = getattr(relv, 'RelatingBuildingElement', None)
-        opening = getattr(relv, 'RelatedOpeningElement', None)
-        if not opening:
-            continue
-        ogid = getattr(opening, 'GlobalId', None) or str(id(opening))
-        if container is not None:
-            opening_to_containers.setdefault(ogid, []).append(container)
+    # opening id -> container types and the door/opening pairs, shared with
+    # build_full_door_space_map so the relations are only walked once
+    if door_index is None:
+        door_index = build_door_fill_index(model)
+    opening_container_types = door_index['opening_container_types']
 
     # We'll also record which door connects to which spaces and which containers its opening sits in
     door_map = {}
     door_container_map = {}
 
-    for rel in model.by_type('IfcRelFillsElement'):
-        opening = getattr(rel, 'RelatingOpeningElement', None)
-        door = getattr(rel, 'RelatedBuildingElement', None)
-        if not (opening and door and door.is_a('IfcDoor')):
-            continue
+    # Space plan bboxes (mm) as one (N, 4) array in spaces_list order. Each space is
+    # tessellated once (shared _BBOX_CACHE) instead of once per door.
+    box_ids = []
+    boxes = []
+    for sp in spaces_list:
+        bb = _bbox2d_mm(sp)
+        if bb:
+            box_ids.append(sp.id())
+            boxes.append(bb)
 
-        # Get opening centroid (try opening first, then door as fallback)
+    # Opening centroid per door (try opening first, then door as fallback)
+    resolved = []
+    for door, opening in door_index['door_fills']:
         oc = get_element_centroid(opening)
         if oc is None:
             oc = get_element_centroid(door)
-        if oc is None:
-            continue
-
-        # Find all spaces that contain this opening
-        connected_spaces = []
-        margin = 500  # 500mm margin
-        for sp in spaces_list:
-            sp_gid = getattr(sp, 'GlobalId', None) or str(id(sp))
-            verts = get_vertices(sp)
-            if verts is not None and len(verts) > 0:
-                verts = verts * 1000.0  # Convert to mm
-                minv = verts.min(axis=0)
-                maxv = verts.max(axis=0)
-                if minv[0] - margin <= oc[0] <= maxv[0] + margin and \
-                   minv[1] - margin <= oc[1] <= maxv[1] + margin:
-                    connected_spaces.append(sp_gid)
-
-        # Link all connected spaces pairwise in adjacency
-        for i in range(len(connected_spaces)):
-            for j in range(i + 1, len(connected_spaces)):
-                a = connected_spaces[i]
-                b = connected_spaces[j]
-                adjacency.setdefault(a, set()).add(b)
-                adjacency.setdefault(b, set()).add(a)
+        if oc is not None:
+            resolved.append((door, opening, oc))
+
+    # All door centroids against all space boxes in one vectorized containment test
+    # (500mm margin); pairs come back door-major, spaces in spaces_list order
+    margin = 500  # 500mm margin
+    door_spaces = [[] for _ in resolved]
+    if resolved and boxes:
+        pairs = _points_in_boxes([oc[:2] for _, _, oc in resolved], boxes, margin)
+        for di, bi in pairs.tolist():
+            door_spaces[di].append(box_ids[bi])
+
+    for (door, opening, oc), connected_spaces in zip(resolved, door_spaces):
+
+        # Link all connected spaces to each other (bulk set update, no per-pair adds)
+        if len(connected_spaces) > 1:
+            for a in connected_spaces:
+                nbs = adjacency[a]
+                nbs.update(connected_spaces)
+                nbs.discard(a)
 
         # Record door -> spaces map
-        dg = getattr(door, 'GlobalId', None) or str(id(door))
-        door_map.setdefault(dg, set()).update(connected_spaces)
+        dg = door.id()
+        for sp_id in connected_spaces:
+            _add_small(door_map, dg, sp_id)
 
         # Record container types (walls etc.) for this opening so we can check compartmentation
-        og = getattr(opening, 'GlobalId', None) or str(id(opening))
-        containers = opening_to_containers.get(og, [])
-        door_container_map[dg] = [c.is_a() for c in containers]
+        og = opening.id()
+        door_container_map[dg] = list(opening_container_types.get(og, ()))
+
+    # Freeze neighbour sets into sorted int arrays (space ids are STEP ids); the BFS only iterates them
+    adjacency = {sid: array('q', sorted(nbs)) for sid, nbs in adjacency.items()}
 
     # Now compute which hallways are linked to stairs.
     # Start from stairs and propagate through hallway nodes only.
     linked_hallways = set()
-    from collections import deque
     q = deque()
 
     # Enqueue all hallways that are directly adjacent to a stair
-    for stair_gid in stair_spaces:
-        for nb in adjacency.get(stair_gid, set()):
+    for stair_id in stair_spaces:
+        for nb in adjacency.get(stair_id, ()):
             if nb in hallway_spaces and nb not in linked_hallways:
                 linked_hallways.add(nb)
                 q.append(nb)
@@ -336,7 +677,7 @@ def build_space_linkages(model, spaces):
     # BFS across hallway nodes only
     while q:
         current = q.popleft()
-        for nb in adjacency.get(current, set()):
+        for nb in adjacency.get(current, ()):
             if nb in hallway_spaces and nb not in linked_hallways: 
                 linked_hallways.add(nb)
                 q.append(nb)
@@ -348,89 +689,64 @@ def build_space_linkages(model, spaces):
 
     # Ensure all spaces have an entry (False for non-hallways)
     for sp in spaces_list:
-        sid = getattr(sp, 'GlobalId', None) or str(id(sp))
+        sid = sp.id()
         space_linked_to_stairs.setdefault(sid, False)
 
     return space_linked_to_stairs, door_map, door_container_map
 
-def build_full_door_space_map(model, margin=1000):
+def build_full_door_space_map(model, margin=1000, door_index=None):
     """Build a complete door->space connectivity map over ALL IfcSpace elements.
     """
-    spaces_list = list(model.by_type('IfcSpace'))
-    # Precompute space bboxes
-    space_bboxes = {}
+    spaces_list = _by_type(model, 'IfcSpace')
+    # Precompute space bboxes as an (N, 4) array so each door is tested against
+    # all spaces with a few vectorized comparisons
+    box_ids = []
+    boxes = []
     for sp in spaces_list:
-        sp_gid = getattr(sp, 'GlobalId', None) or str(id(sp))
         bb = _bbox2d_mm(sp)
         if bb:
-            space_bboxes[sp_gid] = bb
+            box_ids.append(sp.id())
+            boxes.append(bb)
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    bx1, by1, bx2, by2 = boxes.T
+
+    def _hits_box(r):
+        # Same test as _bbox_intersect(r, box) for every space box
+        return (r[2] >= bx1) & (bx2 >= r[0]) & (r[3] >= by1) & (by2 >= r[1])
+
     door_map_all = {}
     door_container_map_all = {}
-    opening_to_containers = {}
-    for relv in model.by_type('IfcRelVoidsElement'):
-        container = getattr(relv, 'RelatingBuildingElement', None)
-        opening = getattr(relv, 'RelatedOpeningElement', None)
-        if not opening:
-            continue
-        ogid = getattr(opening, 'GlobalId', None) or str(id(opening))
-        if container is not None:
-            opening_to_containers.setdefault(ogid, []).append(container)
-    for rel in model.by_type('IfcRelFillsElement'):
-        opening = getattr(rel, 'RelatingOpeningElement', None)
-        door = getattr(rel, 'RelatedBuildingElement', None)
-        if not (opening and door and door.is_a('IfcDoor')):
-            continue
-        oc_open = get_element_centroid(opening)
-        oc_door = get_element_centroid(door)
-        oc = oc_open if oc_open is not None else oc_door
+    if door_index is None:
+        door_index = build_door_fill_index(model)
+    opening_container_types = door_index['opening_container_types']
+    for door, opening in door_index['door_fills']:
+        # Door centroid only needed when the opening has no usable geometry
+        oc = get_element_centroid(opening)
+        if oc is None:
+            oc = get_element_centroid(door)
         if oc is None:
             continue
-        dg = getattr(door, 'GlobalId', None) or str(id(door))
-        connected_spaces = []
+        dg = door.id()
         # Centroid inclusion
-        for sp_gid, (x1,y1,x2,y2) in space_bboxes.items():
-            if (x1 - margin) <= oc[0] <= (x2 + margin) and (y1 - margin) <= oc[1] <= (y2 + margin):
-                connected_spaces.append(sp_gid)
-        # Door bbox intersection
-        db = _bbox2d_mm(door)
-        if db:
-            dx1,dy1,dx2,dy2 = db
-            db_exp = (dx1 - margin, dy1 - margin, dx2 + margin, dy2 + margin)
-            for sp_gid, bb in space_bboxes.items():
-                if sp_gid in connected_spaces:
-                    continue
-                if _bbox_intersect(db_exp, bb):
-                    connected_spaces.append(sp_gid)
-        # Opening bbox intersection (if available)
-        ob = _bbox2d_mm(opening)
-        if ob:
-            ox1,oy1,ox2,oy2 = ob
-            ob_exp = (ox1 - margin, oy1 - margin, ox2 + margin, oy2 + margin)
-            for sp_gid, bb in space_bboxes.items():
-                if sp_gid in connected_spaces:
-                    continue
-                if _bbox_intersect(ob_exp, bb):
-                    connected_spaces.append(sp_gid)
-        if connected_spaces:
-            door_map_all.setdefault(dg, set()).update(connected_spaces)
-        og = getattr(opening, 'GlobalId', None) or str(id(opening))
-        containers = opening_to_containers.get(og, [])
-        door_container_map_all[dg] = [c.is_a() for c in containers]
+        found = ((bx1 - margin) <= oc[0]) & (oc[0] <= (bx2 + margin)) & ((by1 - margin) <= oc[1]) & (oc[1] <= (by2 + margin))
+        hit_order = [found]
+        # Door bbox intersection, then opening bbox intersection (if available);
+        # each stage only adds spaces not matched by an earlier one
+        for bb in (_bbox2d_mm(door), _bbox2d_mm(opening)):
+            if bb:
+                extra = _hits_box((bb[0] - margin, bb[1] - margin, bb[2] + margin, bb[3] + margin)) & ~found
+                hit_order.append(extra)
+                found = found | extra
+        for hits in hit_order:
+            for i in np.flatnonzero(hits).tolist():
+                _add_small(door_map_all, dg, box_ids[i])
+        og = opening.id()
+        door_container_map_all[dg] = list(opening_container_types.get(og, ()))
     # Also add mappings via space boundaries where the RelatedBuildingElement is a door
-    try:
-        for rb in model.by_type('IfcRelSpaceBoundary'):
-            try:
-                sp = getattr(rb, 'RelatingSpace', None)
-                be = getattr(rb, 'RelatedBuildingElement', None)
-                if not sp or not be or not getattr(be, 'is_a', lambda *_: False)('IfcDoor'):
-                    continue
-                sp_gid = getattr(sp, 'GlobalId', None) or str(id(sp))
-                dg = getattr(be, 'GlobalId', None) or str(id(be))
-                door_map_all.setdefault(dg, set()).add(sp_gid)
-            except Exception:
-                continue
-    except Exception:
-        pass
+    door_boundaries = door_index['door_boundaries']
+    if door_boundaries:  # often empty (exporters without space boundaries)
+        for dg, sp_id in door_boundaries:
+            _add_small(door_map_all, dg, sp_id)
     return door_map_all, door_container_map_all
 
 
@@ -438,73 +754,180 @@ def build_full_door_space_map(model, margin=1000):
 # SECTION 6: COMPLIANCE ANALYSIS FUNCTIONS - DOORS, STAIRS, CORRIDORS
 # ============================================================================
 
+@dataclass(slots=True)
+class DoorAnalysis:
+    """Result of analyze_door."""
+    name: str
+    width_mm: Optional[float]  # None when no width could be found
+    linked_spaces: tuple
+    issues: list
+    has_issues: bool
+
+
+@dataclass(slots=True)
+class StairAnalysis:
+    """Result of analyze_stair."""
+    name: str
+    width_mm: Optional[float]  # None when no width could be found
+    issues: list
+    has_issues: bool
+
+
 def analyze_door(door, door_map, opening_map):
     """Analyze a door for BR18 compliance (minimum width requirement).
+
+    opening_map is {door STEP id: IfcOpeningElement} (build_door_fill_index's 'door_to_opening').
     """
     name = getattr(door, 'Name', None) or str(door)
-    gid = getattr(door, 'GlobalId', None) or str(id(door))
-    full = f"{name} [{gid}]"
-    width = get_numeric(door, ['overallwidth', 'width', 'doorwidth'])
-    op = opening_map.get(gid)
+    full = f"{name} [{_key(door)}]"
+    did = door.id()
+    width = get_numeric(door, DOOR_WIDTH_NAMES)
+    op = opening_map.get(did)
     if not width and op:
-        if getattr(op, 'Representation', None):
-            for rep in op.Representation.Representations:
-                for it in getattr(rep, 'Items', []) or []:
-                    if it.is_a('IfcExtrudedAreaSolid'):
-                        prof = getattr(it, 'SweptArea', None)
-                        if prof and prof.is_a('IfcRectangleProfileDef'):
-                            w = to_mm(getattr(prof, 'YDim', None)) or to_mm(getattr(prof, 'XDim', None))
-                            if w:
-                                width = w
-                                break
-                if width:
-                    break
+        for xd, yd in body_rect_profiles(op):
+            w = to_mm(yd) or to_mm(xd)
+            if w:
+                width = w
+                break
     issues = []
     if width is None:
         issues.append('width unknown')
     elif width < DOOR_MIN:
         issues.append(f'width {width:.0f}mm < {DOOR_MIN}mm')
-    linked = door_map.get(gid, set())
-    return {'name': full, 'width_mm': width, 'linked_spaces': linked, 'issues': issues}
+    linked = tuple(_iter_small(door_map.get(did)))
+    return DoorAnalysis(full, width, linked, issues, bool(issues))
 
 
 def analyze_stair(flight):
     """Analyze a stair flight for BR18 compliance (minimum width requirement).
     """
     name = getattr(flight, 'Name', None) or str(flight)
-    gid = getattr(flight, 'GlobalId', None) or str(id(flight))
+    gid = _key(flight)
     full = f"{name} [{gid}]"
-    width = get_numeric(flight, ['actual run width', 'actualrunwidth', 'run width', 'width', 'tread'])
-    if width is None and getattr(flight, 'Representation', None):
-        for rep in flight.Representation.Representations:
-            for it in getattr(rep, 'Items', []) or []:
-                if it.is_a('IfcExtrudedAreaSolid'):
-                    prof = getattr(it, 'SweptArea', None)
-                    if prof and prof.is_a('IfcRectangleProfileDef'):
-                        xd = float(getattr(prof, 'XDim', 0) or 0)
-                        yd = float(getattr(prof, 'YDim', 0) or 0)
-                        xd = xd if xd > 100 else xd * 1000.0
-                        yd = yd if yd > 100 else yd * 1000.0
-                        width = max(xd, yd)
-                        break
-            if width is not None:
-                break
+    # Fast path: read ActualRunWidth directly when the schema/exporter exposes it as an attribute
+    width = to_mm(getattr(flight, 'ActualRunWidth', None)) or None
+    if width is None:
+        width = get_numeric(flight, STAIR_WIDTH_NAMES)
+    if width is None:
+        for xd, yd in body_rect_profiles(flight)[:1]:
+            xd = _num(xd) or 0.0
+            yd = _num(yd) or 0.0
+            # Detect units once per profile so both axes are scaled together:
+            # a (1200, 90) mm profile is 1200mm wide, not 90 m.
+            scale = 1.0 if (xd if xd >= yd else yd) > 100 else 1000.0
+            xd *= scale; yd *= scale
+            width = xd if xd >= yd else yd
     issues = []
     if width is None:
         issues.append('width unknown')
     elif width + 1e-6 < STAIR_MIN:
         issues.append(f'width {width:.0f}mm < {STAIR_MIN}mm')
-    return {'name': full, 'width_mm': width, 'issues': issues}
+    return StairAnalysis(full, width, issues, bool(issues))
+
+
+def analyze_corridor_dimensions(spaces):
+    """Return (length, width) in mm for each corridor space, in input order.
+
+    Geometry is tried first: the plan (X/Y) extents of all spaces are reduced in
+    one NumPy pass, the longer side being the length. Spaces without usable
+    geometry fall back to the rectangle that matches their Area/Perimeter, solved
+    for all of them at once.
+    """
+    verts = [get_vertices(sp) for sp in spaces]
+
+    dims = [(0, 0)] * len(spaces)
+    have = [i for i, v in enumerate(verts) if v is not None and len(v) > 0]
+    if have:
+        # Stack X/Y of every space (mm) and reduce per space segment with reduceat
+        stacked = np.concatenate([verts[i][:, :2] for i in have])
+        stacked *= 1000.0  # fresh array from concatenate, so scale in place
+        starts = np.zeros(len(have), dtype=np.intp)
+        np.cumsum([len(verts[i]) for i in have[:-1]], out=starts[1:])
+        ext = np.maximum.reduceat(stacked, starts) - np.minimum.reduceat(stacked, starts)
+        lengths = ext.max(axis=1).tolist()
+        widths = ext.min(axis=1).tolist()
+        for k, i in enumerate(have):
+            if lengths[k] > 0:
+                dims[i] = (lengths[k], widths[k])
+    todo = [i for i, (_, w) in enumerate(dims) if w == 0]
+    if not todo:
+        return dims
+
+    A = np.array([get_numeric(spaces[i], AREA_NAMES) or 0.0 for i in todo], dtype=np.float64)
+    P = np.array([get_numeric(spaces[i], PERIMETER_NAMES) or 0.0 for i in todo], dtype=np.float64)
+    A_m2 = np.where(A > 1000, A / 1_000_000.0, A)
+    P_m = _to_mm_arr(P)
+    s = P_m / 2.0
+    w = (s - np.sqrt(np.maximum(0.0, s * s - 4 * A_m2))) / 2.0
+    ok = (A != 0) & (P != 0) & (w != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lengths = (A_m2 / w) * 1000.0
+    widths = w * 1000.0
+    for k, i in enumerate(todo):
+        if ok[k]:
+            dims[i] = (float(lengths[k]), float(widths[k]))
+    return dims
+
+
+@dataclass(slots=True)
+class CorridorAnalysis:
+    """Per-corridor analysis record (fixed fields instead of a per-space dict)."""
+    space: object
+    name: Optional[str]
+    type: Optional[str]
+    width: float
+    length: float
+    links_to_stairs: bool = False
+    is_elongated: bool = False
+    check: Optional['CorridorCheck'] = None  # set once by check_corridors() in main()
+
+
+# Result of the corridor width/stair-link check (one per corridor analysis)
+CorridorCheck = namedtuple('CorridorCheck', 'width_ok links_ok ratio issues')
+
+
+def _corridor_masks(widths, lengths, min_width):
+    """Width pass mask and length/width ratio (0 where width <= 0) for float64 arrays."""
+    pos = widths > 0
+    return widths >= min_width, np.where(pos, lengths / np.where(pos, widths, 1.0), 0.0)
+
+
+def check_corridors(analyses):
+    """Check corridor analyses against BR18 (width >= 1300mm, links to stairs).
+
+    Returns one CorridorCheck per analysis, in input order. Widths, lengths and
+    stair links are gathered into arrays so the pass masks and ratios are computed
+    for all corridors at once; issue strings are only built for failures.
+    """
+    n = len(analyses)
+    widths = np.fromiter((a.width for a in analyses), dtype=np.float64, count=n)
+    lengths = np.fromiter((a.length for a in analyses), dtype=np.float64, count=n)
+    links = np.fromiter((bool(a.links_to_stairs) for a in analyses), dtype=bool, count=n)
+    width_ok, ratios = _corridor_masks(widths, lengths, CORRIDOR_MIN)
+
+    out = []
+    for a, w_ok, l_ok, ratio in zip(analyses, width_ok.tolist(), links.tolist(), ratios.tolist()):
+        issues = []
+        if not w_ok:
+            issues.append(f"Width is {a.width:.0f}mm")
+        if not l_ok:
+            issues.append("Does not link to stairs via doors/openings")
+        out.append(CorridorCheck(w_ok, l_ok, ratio, issues))
+    return out
 
 
 # ============================================================================
 # SECTION 7: STAIRCASE GROUPING AND ENCLOSURE ANALYSIS
 # ============================================================================
 
+# Leading staircase number in a flight name tail such as '1282665 Run 1'
+_STAIR_ID_RE = _re.compile(r'(\d+)')
+
+
 def analyze_staircase_groups(model):
     """Group IfcStairFlight elements by their base staircase identifier extracted from the Name.
     """
-    flights = model.by_type('IfcStairFlight')
+    flights = _by_type(model, 'IfcStairFlight')
     groups = {}
     for fl in flights:
         name = (getattr(fl, 'Name', None) or '')
@@ -515,8 +938,7 @@ def analyze_staircase_groups(model):
             # Take last part then isolate leading digits
             tail = parts[-1].strip()
             # tail may look like '1282665 Run 1' -> take digits at start
-            import re as _re
-            m = _re.match(r'(\d+)', tail)
+            m = _STAIR_ID_RE.match(tail)
             if m:
                 stair_id = m.group(1)
         if not stair_id:
@@ -544,7 +966,8 @@ def analyze_staircase_groups(model):
             'id': sid,
             'flight_count': len(g['flights']),
             'run_labels': run_labels_norm,
-            'is_standard_3_run': is_standard
+            'is_standard_3_run': is_standard,
+            'flights': g['flights'],
         })
     return out
 
@@ -558,9 +981,6 @@ def analyze_staircase_group_enclosure(model, side_margin=300.0, wall_search_expa
     if not groups:
         return []
 
-    # Collect flights indexed by gid & names for quick membership
-    flights = { (getattr(f,'GlobalId',None) or str(id(f))): f for f in model.by_type('IfcStairFlight') }
-
     # Geometry-based stair spaces mapping (space_gid -> {'space','name','flight_gids'})
     geom_stair_spaces = identify_stair_spaces_geometry(model)
     # Invert mapping flight_gid -> list(space_gid)
@@ -570,7 +990,7 @@ def analyze_staircase_group_enclosure(model, side_margin=300.0, wall_search_expa
             flight_to_spaces.setdefault(fg, set()).add(sp_gid)
 
     # Walls (standard + regular)
-    walls = list(model.by_type('IfcWall')) + list(model.by_type('IfcWallStandardCase'))
+    walls = chain(_by_type(model, 'IfcWall'), _by_type(model, 'IfcWallStandardCase'))
     wall_bboxes = []
     for w in walls:
         wb = _bbox2d_mm(w)
@@ -582,13 +1002,12 @@ def analyze_staircase_group_enclosure(model, side_margin=300.0, wall_search_expa
         sid = g['id']
         group_flight_gids = []
         flight_bboxes = []
-        for fl_gid, fl in flights.items():
-            name = getattr(fl, 'Name', None) or ''
-            if sid in name:  # flight belongs to this staircase id
-                bb = _bbox2d_mm(fl)
-                if bb:
-                    flight_bboxes.append(bb)
-                    group_flight_gids.append(fl_gid)
+        # Flights were already bucketed by staircase id in analyze_staircase_groups
+        for fl in g['flights']:
+            bb = _bbox2d_mm(fl)
+            if bb:
+                flight_bboxes.append(bb)
+                group_flight_gids.append(_key(fl))
         if not flight_bboxes:
             results.append({'id': sid, 'flight_count': g['flight_count'], 'sides_covered': 0, 'missing_sides': ['left','right','bottom','top'], 'has_issue': True, 'source': 'none'} )
             continue
@@ -638,85 +1057,19 @@ def analyze_staircase_group_enclosure(model, side_margin=300.0, wall_search_expa
 
         # Optional debug print for one target group id
         if debug_group_id and sid == str(debug_group_id):
-            print(f"DEBUG StaircaseGroup {sid}: source={source} flights={len(group_flight_gids)} spaces={len(space_bboxes)} bbox=({xs1:.1f},{ys1:.1f},{xs2:.1f},{ys2:.1f}) sides_covered={sides_covered}/3 missing={missing}")
+            buf = io.StringIO(); w = buf.write
+            w(f"DEBUG StaircaseGroup {sid}: source={source} flights={len(group_flight_gids)} spaces={len(space_bboxes)} bbox=({xs1:.1f},{ys1:.1f},{xs2:.1f},{ys2:.1f}) sides_covered={sides_covered}/3 missing={missing}\n")
             if space_bboxes:
                 for i, sb in enumerate(space_bboxes):
-                    print(f"  DEBUG space_bbox[{i}]={sb}")
+                    w(f"  DEBUG space_bbox[{i}]={sb}\n")
             for i, fb in enumerate(flight_bboxes[:5]):
-                print(f"  DEBUG flight_bbox[{i}]={fb}")
+                w(f"  DEBUG flight_bbox[{i}]={fb}\n")
+            sys.stdout.write(buf.getvalue())
 
         results.append({'id': sid, 'flight_count': g['flight_count'], 'sides_covered': sides_covered, 'missing_sides': missing, 'has_issue': has_issue, 'source': source})
     return results
 
 
-def identify_stair_spaces_geometry(model):
-    """Identify stair spaces by associating each IfcStairFlight centroid with a containing IfcSpace.
-    """
-    spaces = model.by_type('IfcSpace')
-    flights = model.by_type('IfcStairFlight')
-    # Precompute space bboxes
-    space_bbox = {}
-    for sp in spaces:
-        gid = getattr(sp, 'GlobalId', None) or str(id(sp))
-        bb = _bbox2d_mm(sp)
-        if bb:
-            space_bbox[gid] = bb
-    # Get flight centroids
-    flight_centroids = {}
-    for fl in flights:
-        verts = get_vertices(fl)
-        if verts is not None and len(verts) > 0:
-            verts = verts * 1000.0
-            c = verts.mean(axis=0)
-            flight_centroids[getattr(fl, 'GlobalId', None) or str(id(fl))] = (float(c[0]), float(c[1]))
-    # Associate
-    stair_spaces = {}
-    margin = 300.0
-    for fl_gid, (fx, fy) in flight_centroids.items():
-        for sp_gid, bb in space_bbox.items():
-            x1,y1,x2,y2 = bb
-            if (x1 - margin) <= fx <= (x2 + margin) and (y1 - margin) <= fy <= (y2 + margin):
-                sp = next((s for s in spaces if (getattr(s,'GlobalId',None) or str(id(s)))==sp_gid), None)
-                if sp is None:
-                    continue
-                entry = stair_spaces.setdefault(sp_gid, {'space': sp, 'name': getattr(sp,'Name',None) or sp_gid, 'flight_gids': set()})
-                entry['flight_gids'].add(fl_gid)
-    # Merge name-based spaces even if no flight caught (keep original 5)
-    for sp in spaces:
-        name_l = (getattr(sp,'Name',None) or '').lower()
-        if 'stair' in name_l:
-            sp_gid = getattr(sp,'GlobalId',None) or str(id(sp))
-            stair_spaces.setdefault(sp_gid, {'space': sp, 'name': getattr(sp,'Name',None) or sp_gid, 'flight_gids': set()})
-    return stair_spaces
-
-
-def _bbox2d_mm(entity):
-    """Return (xmin,ymin,xmax,ymax) in mm for an entity using geometry verts; None on failure."""
-    try:
-        # Cache by type + GlobalId
-        try:
-            gid = getattr(entity, 'GlobalId', None) or str(id(entity))
-            et = entity.is_a() if hasattr(entity, 'is_a') else type(entity).__name__
-            key = (et, gid)
-        except Exception:
-            key = None
-        if key and key in _BBOX_CACHE:
-            return _BBOX_CACHE[key]
-
-        verts = get_vertices(entity)
-        if verts is None or len(verts) == 0:
-            return None
-        verts = verts * 1000.0
-        minv = verts.min(axis=0)
-        maxv = verts.max(axis=0)
-        bb = (float(minv[0]), float(minv[1]), float(maxv[0]), float(maxv[1]))
-        if key:
-            _BBOX_CACHE[key] = bb
-        return bb
-    except Exception:
-        return None
-
-
 # ============================================================================
 # SECTION 8: BOUNDING BOX AND GEOMETRIC HELPER FUNCTIONS
 # ============================================================================
@@ -727,6 +1080,57 @@ def _bbox_intersect(a, b, margin=0.0):
     return not (ax2 < bx1 - margin or bx2 < ax1 - margin or ay2 < by1 - margin or by2 < ay1 - margin)
 
 
+# Above this many point/box pairs the (M, N) boolean mask of the NumPy path gets
+# large, so the numba kernel (when installed) is used instead.
+_JIT_MIN_PAIRS = 1_000_000
+
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _points_in_boxes_jit(pts, boxes, margin):
+        m = pts.shape[0]
+        n = boxes.shape[0]
+        counts = np.zeros(m, np.int64)
+        for i in prange(m):
+            c = 0
+            for j in range(n):
+                if (boxes[j, 0] - margin <= pts[i, 0] and pts[i, 0] <= boxes[j, 2] + margin and
+                        boxes[j, 1] - margin <= pts[i, 1] and pts[i, 1] <= boxes[j, 3] + margin):
+                    c += 1
+            counts[i] = c
+        offsets = np.zeros(m + 1, np.int64)
+        for i in range(m):
+            offsets[i + 1] = offsets[i] + counts[i]
+        out = np.empty((offsets[m], 2), np.int64)
+        for i in prange(m):
+            k = offsets[i]
+            for j in range(n):
+                if (boxes[j, 0] - margin <= pts[i, 0] and pts[i, 0] <= boxes[j, 2] + margin and
+                        boxes[j, 1] - margin <= pts[i, 1] and pts[i, 1] <= boxes[j, 3] + margin):
+                    out[k, 0] = i
+                    out[k, 1] = j
+                    k += 1
+        return out
+
+
+def _points_in_boxes(pts, boxes, margin=0.0):
+    """Return (point_idx, box_idx) pairs where 2D point lies in bbox expanded by margin.
+
+    pts is (M, 2+) and boxes is (N, 4) as (xmin, ymin, xmax, ymax). Pairs come
+    out point-major, i.e. in the same order as a nested points/boxes loop.
+    """
+    pts = np.asarray(pts, dtype=np.float64)
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if pts.size == 0 or boxes.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    if njit is not None and len(pts) * len(boxes) >= _JIT_MIN_PAIRS:
+        return _points_in_boxes_jit(np.ascontiguousarray(pts[:, :2]), np.ascontiguousarray(boxes), float(margin))
+    px = pts[:, 0:1]; py = pts[:, 1:2]
+    mask = ((boxes[:, 0] - margin <= px) & (px <= boxes[:, 2] + margin) &
+            (boxes[:, 1] - margin <= py) & (py <= boxes[:, 3] + margin))
+    return np.argwhere(mask)
+
+
 # ============================================================================
 # ============================================================================
 # SECTION 9: STAIR FLIGHT ENCLOSURE & GEOMETRY HELPERS
@@ -742,63 +1146,63 @@ def identify_stair_spaces_geometry(model):
     stair space if at least one stair flight centroid lies inside its 2D bbox (with margin).
     Returns a dict: {space_gid: {'space': space, 'name': name, 'flight_gids': set([...])}}
     """
-    spaces = model.by_type('IfcSpace')
-    flights = model.by_type('IfcStairFlight')
-    # Precompute space bboxes
+    spaces = _by_type(model, 'IfcSpace')
+    flights = _by_type(model, 'IfcStairFlight')
+    # Precompute space bboxes, and the (space, report name) behind each key (first one
+    # wins, like a scan would). Name-based stair spaces are picked out in the same pass.
     space_bbox = {}
+    space_by_gid = {}
+    named_stairs = []
     for sp in spaces:
-        gid = getattr(sp, 'GlobalId', None) or str(id(sp))
+        gid = _key(sp)
+        name = getattr(sp, 'Name', None)
+        space_by_gid.setdefault(gid, (sp, name or gid))
+        if name and 'stair' in name.lower():
+            named_stairs.append((gid, sp, name))
         bb = _bbox2d_mm(sp)
         if bb:
             space_bbox[gid] = bb
-    # Get flight centroids
+    # Get flight centroids (memoized in _CENTROID_CACHE, shared with the linkage builders)
     flight_centroids = {}
     for fl in flights:
-        verts = get_vertices(fl)
-        if verts is not None and len(verts) > 0:
-            verts = verts * 1000.0
-            c = verts.mean(axis=0)
-            flight_centroids[getattr(fl, 'GlobalId', None) or str(id(fl))] = (float(c[0]), float(c[1]))
-    # Associate
+        c = get_element_centroid(fl)
+        if c is not None:
+            flight_centroids[_key(fl)] = (float(c[0]), float(c[1]))
+    # Associate (all flight centroids against all space bboxes in one call)
     stair_spaces = {}
     margin = 300.0
-    for fl_gid, (fx, fy) in flight_centroids.items():
-        for sp_gid, bb in space_bbox.items():
-            x1,y1,x2,y2 = bb
-            if (x1 - margin) <= fx <= (x2 + margin) and (y1 - margin) <= fy <= (y2 + margin):
-                sp = next((s for s in spaces if (getattr(s,'GlobalId',None) or str(id(s)))==sp_gid), None)
-                if sp is None:
-                    continue
-                entry = stair_spaces.setdefault(sp_gid, {'space': sp, 'name': getattr(sp,'Name',None) or sp_gid, 'flight_gids': set()})
-                entry['flight_gids'].add(fl_gid)
+    fl_gids = list(flight_centroids)
+    sp_gids = list(space_bbox)
+    pairs = _points_in_boxes([flight_centroids[g] for g in fl_gids], [space_bbox[g] for g in sp_gids], margin)
+    for i, j in pairs:
+        fl_gid = fl_gids[i]; sp_gid = sp_gids[j]
+        hit = space_by_gid.get(sp_gid)
+        if hit is None:
+            continue
+        entry = stair_spaces.setdefault(sp_gid, {'space': hit[0], 'name': hit[1], 'flight_gids': set()})
+        entry['flight_gids'].add(fl_gid)
     # Merge name-based spaces even if no flight caught (keep original 5)
-    for sp in spaces:
-        name_l = (getattr(sp,'Name',None) or '').lower()
-        if 'stair' in name_l:
-            sp_gid = getattr(sp,'GlobalId',None) or str(id(sp))
-            stair_spaces.setdefault(sp_gid, {'space': sp, 'name': getattr(sp,'Name',None) or sp_gid, 'flight_gids': set()})
+    for sp_gid, sp, name in named_stairs:
+        stair_spaces.setdefault(sp_gid, {'space': sp, 'name': name, 'flight_gids': set()})
     return stair_spaces
 
 
 def _bbox2d_mm(entity):
     """Return (xmin,ymin,xmax,ymax) in mm for an entity using geometry verts; None on failure."""
     try:
-        # Cache by type + GlobalId
-        try:
-            gid = getattr(entity, 'GlobalId', None) or str(id(entity))
-            et = entity.is_a() if hasattr(entity, 'is_a') else type(entity).__name__
-            key = (et, gid)
-        except Exception:
-            key = None
+        # Cache by model + type + GlobalId
+        key = _cache_key(entity)
         if key and key in _BBOX_CACHE:
             return _BBOX_CACHE[key]
 
         verts = get_vertices(entity)
         if verts is None or len(verts) == 0:
             return None
-        verts = verts * 1000.0
-        minv = verts.min(axis=0)
-        maxv = verts.max(axis=0)
+        # Reduce the X/Y columns in place and scale the four results to mm
+        # (scaling is monotonic, so this equals min/max of verts * 1000)
+        xy = verts[:, :2]
+        minv = xy.min(axis=0) * 1000.0
+        maxv = xy.max(axis=0) * 1000.0
         bb = (float(minv[0]), float(minv[1]), float(maxv[0]), float(maxv[1]))
         if key:
             _BBOX_CACHE[key] = bb
@@ -807,13 +1211,6 @@ def _bbox2d_mm(entity):
         return None
 
 
-def _bbox_intersect(a, b, margin=0.0):
-    ax1, ay1, ax2, ay2 = a
-    bx1, by1, bx2, by2 = b
-    return not (ax2 < bx1 - margin or bx2 < ax1 - margin or ay2 < by1 - margin or by2 < ay1 - margin)
-
-
-
 
 def analyze_stairflight_4wall_enclosure(model, side_margin=300.0, wall_search_expand=500.0):
     """Simple 4-wall enclosure check for IfcStairFlight entities.
@@ -821,32 +1218,41 @@ def analyze_stairflight_4wall_enclosure(model, side_margin=300.0, wall_search_ex
     Returns list: {flight_name, flight_gid, fully_enclosed (bool), sides_covered, missing_sides}
     Debug and wall listing removed per user request.
     """
-    flights = model.by_type('IfcStairFlight')
+    flights = _by_type(model, 'IfcStairFlight')
     if not flights:
         return []
 
-    walls = list(model.by_type('IfcWall')) + list(model.by_type('IfcWallStandardCase'))
+    # Walked once per storey below, so keep a sequence (tuple concat, no list copies)
+    walls = _by_type(model, 'IfcWall') + _by_type(model, 'IfcWallStandardCase')
+    # Storey lookup through each element's ContainedInStructure inverse instead of a
+    # scan over every IfcRelContainedInSpatialStructure in the model.
+    # Values are storey STEP ids so membership compares by identity of the storey, not the wrapper.
+    def _storey_id(e):
+        for rel in getattr(e, 'ContainedInStructure', None) or ():
+            parent = getattr(rel, 'RelatingStructure', None)
+            if parent and parent.is_a('IfcBuildingStorey'):
+                return parent.id()
+        return None
+
+    # GlobalIds are read once per element; the storey and 'ALL' wall lists reuse them
+    wall_gids = [_key(w) for w in walls]
+    flight_gids = [_key(fl) for fl in flights]
+
     wall_to_storey = {}
+    for w, w_gid in zip(walls, wall_gids):
+        st = _storey_id(w)
+        if st is not None:
+            wall_to_storey[w_gid] = st
     flight_to_storey = {}
-    
-    for rel in model.by_type('IfcRelContainedInSpatialStructure'):
-        parent = getattr(rel, 'RelatingStructure', None)
-        if parent and parent.is_a('IfcBuildingStorey'):
-            for e in getattr(rel, 'RelatedElements', []) or []:
-                try:
-                    gid = getattr(e, 'GlobalId', None) or str(id(e))
-                    if e.is_a('IfcWall') or e.is_a('IfcWallStandardCase'):
-                        wall_to_storey[gid] = parent
-                    if e.is_a('IfcStairFlight'):
-                        flight_to_storey[gid] = parent
-                except Exception:
-                    continue
+    for fl, fl_gid in zip(flights, flight_gids):
+        st = _storey_id(fl)
+        if st is not None:
+            flight_to_storey[fl_gid] = st
 
     wall_bboxes_by_storey = {}
     results = []
     
-    for flight in flights:
-        flight_gid = getattr(flight, 'GlobalId', None) or str(id(flight))
+    for flight, flight_gid in zip(flights, flight_gids):
         flight_name = getattr(flight, 'Name', None) or flight_gid
         
     # (Removed debug classification logic)
@@ -867,13 +1273,12 @@ def analyze_stairflight_4wall_enclosure(model, side_margin=300.0, wall_search_ex
         storey = flight_to_storey.get(flight_gid)
 
         candidate_walls = []
-        if storey:
-            sid = getattr(storey, 'GlobalId', None) or str(id(storey))
+        if storey is not None:
+            sid = storey
             if sid not in wall_bboxes_by_storey:
                 wall_bboxes_by_storey[sid] = []
-                for w in walls:
-                    w_gid = getattr(w, 'GlobalId', None) or str(id(w))
-                    if wall_to_storey.get(w_gid) is storey:
+                for w, w_gid in zip(walls, wall_gids):
+                    if wall_to_storey.get(w_gid) == storey:
                         wb = _bbox2d_mm(w)
                         if wb:
                             wall_bboxes_by_storey[sid].append((w_gid, wb))
@@ -883,10 +1288,10 @@ def analyze_stairflight_4wall_enclosure(model, side_margin=300.0, wall_search_ex
         if not candidate_walls:
             if 'ALL' not in wall_bboxes_by_storey:
                 wall_bboxes_by_storey['ALL'] = []
-                for w in walls:
+                for w, w_gid in zip(walls, wall_gids):
                     wb = _bbox2d_mm(w)
                     if wb:
-                        wall_bboxes_by_storey['ALL'].append((getattr(w, 'GlobalId', None) or str(id(w)), wb))
+                        wall_bboxes_by_storey['ALL'].append((w_gid, wb))
             candidate_walls = wall_bboxes_by_storey['ALL']
 
         # Build all 4 side strips
@@ -916,6 +1321,20 @@ def analyze_stairflight_4wall_enclosure(model, side_margin=300.0, wall_search_ex
     return results
 
 
+def open_model(path):
+    """Open the IFC file; large files are opened lazily where ifcopenshell supports it.
+
+    Only spaces, doors, stairs, walls and their relations are read, so a lazy
+    open avoids parsing the attributes of everything else in a big model.
+    """
+    if os.path.getsize(path) > LAZY_OPEN_BYTES:
+        try:
+            return ifcopenshell.open(path, lazy=True)
+        except TypeError:  # ifcopenshell < 0.9 has no lazy loading
+            pass
+    return ifcopenshell.open(path)
+
+
 # ============================================================================
 # SECTION 10: MAIN ANALYSIS FUNCTION
 # ============================================================================
@@ -923,114 +1342,94 @@ def analyze_stairflight_4wall_enclosure(model, side_margin=300.0, wall_search_ex
 def main():
     """Main BR18 compliance analysis function - focused on corridor evacuation route checking.
     """
-    model = ifcopenshell.open(IFC_PATH)
-    all_spaces = model.by_type('IfcSpace')
+    model = open_model(IFC_PATH)
+    # Flatten every pset/qto in the model once, up front, for get_numeric
+    build_props_index(model)
+    # Entity lists used below are fetched once up front
+    all_spaces = _by_type(model, 'IfcSpace')
+    all_doors = _by_type(model, 'IfcDoor')
+    flights = _by_type(model, 'IfcStairFlight')
+    storeys = _by_type(model, 'IfcBuildingStorey')
+    # Tessellate everything the geometry checks touch in one threaded pass up front
+    walls = _by_type(model, 'IfcWall') + _by_type(model, 'IfcWallStandardCase')
+    prefetch_vertices(model, chain(all_spaces, all_doors, _by_type(model, 'IfcOpeningElement'), flights, walls))
 
     def _n(sp):
         """Helper function to get lowercase space name for token matching."""
         return (getattr(sp, 'Name', '') or '').lower()
 
-    # Define tokens that identify corridor/hallway spaces
-    hallway_tokens = ['hallway', 'corridor', 'passage', 'circulation']
-
     # Select corridor spaces only (these are the 18 we report on) + collect stair spaces for linkage graph
-    corridor_spaces = [sp for sp in all_spaces if any(t in _n(sp) for t in hallway_tokens)]
-    stair_spaces = [sp for sp in all_spaces if 'stair' in _n(sp)]
+    # Each space name is read and lowercased once for both selections
+    # The stair/hallway kind used by the linkage graph is recorded in the same pass
+    corridor_spaces = []
+    stair_spaces = []
+    space_kinds = {}
+    for sp in all_spaces:
+        n = _n(sp)
+        kind = space_kinds[sp.id()] = _space_kind(n)
+        if kind == 'hallway' or _CORRIDOR_RE.search(n):
+            corridor_spaces.append(sp)
+        if kind == 'stair':
+            stair_spaces.append(sp)
 
     # For building door/stair adjacency we include corridor + stair spaces only
     linkage_spaces = corridor_spaces + stair_spaces
 
     # Dictionary to store analysis results for each corridor
-    # Key: space GlobalId, Value: dict with space details and analysis results
+    # Key: space STEP id, Value: CorridorAnalysis with space details and analysis results
     analyses = {}
     
-    for sp in corridor_spaces:  # Only analyse corridors
-        sid = getattr(sp, 'GlobalId', None) or str(id(sp))
-        # Try geometry first for accurate width
-        length, width = extract_dimensions_from_geometry(sp)
-        if width == 0:  # fallback to area/perimeter if geometry fails
-            A = get_numeric(sp, ['area'])
-            P = get_numeric(sp, ['perimeter'])
-            if A and P:
-                if A > 1000:
-                    A_m2 = A / 1_000_000.0
-                else:
-                    A_m2 = A
-                P_m = P if P > 100 else P * 1000.0
-                try:
-                    s = P_m / 2.0
-                    w = (s - math.sqrt(max(0, s * s - 4 * A_m2))) / 2.0
-                    length = (A_m2 / w) * 1000.0
-                    width = w * 1000.0
-                except Exception:
-                    pass
-        analyses[sid] = {
-            'space': sp,
-            'name': getattr(sp, 'Name', None),
-            'type': getattr(sp, 'LongName', None),
-            'width': width,
-            'length': length,
-        }
+    corridor_dims = analyze_corridor_dimensions(corridor_spaces)
+    for sp, (length, width) in zip(corridor_spaces, corridor_dims):  # Only analyse corridors
+        sid = sp.id()
+        analyses[sid] = CorridorAnalysis(sp, getattr(sp, 'Name', None), getattr(sp, 'LongName', None), width, length)
 
     # Build linkages (doors between corridor+stair subset)
-    space_linked, door_map, door_container_map = build_space_linkages(model, linkage_spaces)
+    # Door/opening relations are walked once and shared by both linkage builders
+    door_index = build_door_fill_index(model)
+    space_linked, door_map, door_container_map = build_space_linkages(model, linkage_spaces, door_index, space_kinds)
 
     for sid, a in analyses.items():
-        a['links_to_stairs'] = space_linked.get(sid, False)
-        a['is_elongated'] = (a['length'] >= 3 * a['width']) if a['width'] > 0 else False
+        a.links_to_stairs = space_linked.get(sid, False)
+        a.is_elongated = (a.length >= 3 * a.width) if a.width > 0 else False
 
     corridors = [(sid, a) for sid, a in analyses.items()]  # analyses already corridor-only
     # Build enhanced full door-space map (global scope) for richer stair entry detection
-    door_map_all, door_container_map_all = build_full_door_space_map(model)
-    doors = [analyze_door(d, door_map_all, door_container_map_all) for d in model.by_type('IfcDoor')]
-    failing_doors = [d for d in doors if d['issues']]
-    flights = model.by_type('IfcStairFlight')
+    door_map_all, door_container_map_all = build_full_door_space_map(model, door_index=door_index)
+    # Width fallback reads the filled opening's profile, looked up in the prebuilt door -> opening map
+    door_to_opening = door_index['door_to_opening']
+    doors = [analyze_door(d, door_map_all, door_to_opening) for d in all_doors]
+    failing_doors = [d for d in doors if d.has_issues]
     stairs = [analyze_stair(f) for f in flights]
-    failing_stairs = [s for s in stairs if s['issues']]
+    failing_stairs = [s for s in stairs if s.has_issues]
 
     # Identify failing corridors (width < 1300mm OR no link to stairs)
+    # Evaluate every corridor once; the failing and passing lists both read a.check
+    for a, chk in zip(analyses.values(), check_corridors(list(analyses.values()))):
+        a.check = chk
+    # Split into failing and passing in the same pass (no second scan over corridors)
     failing_corridors = []
-    for sid, a in corridors:
-        checks = 0; issues = []
-        if a['width'] >= CORRIDOR_MIN:
-            checks += 1
-        else:
-            issues.append(f"Width is {a['width']:.0f}mm")
-        if a['links_to_stairs']:
-            checks += 1
-        else:
-            issues.append(f"Does not link to stairs via doors/openings")
-        if checks < 2:
-            failing_corridors.append({'name': f"{a.get('name')} [{sid}]", 'issues': issues})
-
-    # Determine passing corridors (those not in failing list)
-    failing_sids = set()
-    for fc in failing_corridors:
-        n = fc.get('name','')
-        if '[' in n and n.endswith(']'):
-            sid_parsed = n.split('[')[-1][:-1]
-            failing_sids.add(sid_parsed)
-
     passing_corridors = []
     for sid, a in corridors:
-        if sid in failing_sids:
+        chk = a.check
+        if chk.issues:
+            failing_corridors.append({'name': f"{a.name} [{_key(a.space)}]", 'issues': chk.issues})
             continue
         checks_passed = []
-        w = a.get('width', 0) or 0
-        if w >= CORRIDOR_MIN:
+        if chk.width_ok:
             checks_passed.append('width')
-        if a.get('links_to_stairs'):
+        if chk.links_ok:
             checks_passed.append('stairs')
-        ratio = (a['length'] / a['width']) if a['width'] > 0 else 0
         passing_corridors.append({
-            'name': f"{a.get('name')} [{sid}]",
-            'width_mm': float(w),
-            'length_mm': float(a.get('length', 0) or 0),
-            'links_stairs': a.get('links_to_stairs', False),
-            'ratio': float(ratio),
+            'name': f"{a.name} [{_key(a.space)}]",
+            'width_mm': float(a.width),
+            'length_mm': float(a.length or 0),
+            'links_stairs': a.links_to_stairs,
+            'ratio': float(chk.ratio),
             'passed': checks_passed,
         })
 
+
     # ========================================================================
     # STAIR FLIGHT ENCLOSURE CHECKS
     # ========================================================================
@@ -1040,7 +1439,7 @@ def main():
 
     # Staircase (flight group) summary - groups flights by staircase ID
     staircase_groups = analyze_staircase_groups(model)
-    storey_count = len(model.by_type('IfcBuildingStorey'))
+    storey_count = len(storeys)
     expected_groups = max(storey_count - 2, 0) * 3 if storey_count >= 3 else max(storey_count - 1, 0) * 3
 
     # Staircase group proximity enclosure check
@@ -1055,7 +1454,6 @@ def main():
     # ========================================================================
     
     # Export summary to Excel (.xlsx) only with timestamp
-    import os
     from datetime import datetime
     base_dir = os.path.dirname(__file__)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -1083,17 +1481,23 @@ def main():
 
         # Table header (row 7) with formatting
         ws.append(['Category', 'Passing count', 'Failing count', "Failing element ID's", 'Reason for failure'])
+        # Style objects are built once and shared by every cell that uses them
+        header_font = Font(bold=True)
+        header_fill = PatternFill(start_color='FFEFEFEF', end_color='FFEFEFEF', fill_type='solid')
+        header_align = Alignment(horizontal='center')
+        wrap_top = Alignment(wrap_text=True, vertical='top')
         for c in ('A','B','C','D','E'):
-            ws[f"{c}7"].font = Font(bold=True)
-            ws[f"{c}7"].fill = PatternFill(start_color='FFEFEFEF', end_color='FFEFEFEF', fill_type='solid')
-            ws[f"{c}7"].alignment = Alignment(horizontal='center')
+            cell = ws[f"{c}7"]
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_align
 
         # Row 8: Doors compliance data
         door_fail_ids = []  # we don't have IDs directly for failing doors in summary; leave empty or collect if available
         door_reasons = []
         for d in failing_doors:
-            door_fail_ids.append('')  # ID not stored; could be parsed from d['name'] if needed
-            door_reasons.append('; '.join(d.get('issues', [])))
+            door_fail_ids.append('')  # ID not stored; could be parsed from d.name if needed
+            door_reasons.append('; '.join(d.issues))
         ws.append([
             'Doors',
             (len(doors) - len(failing_doors)),  # Passing count
@@ -1102,8 +1506,8 @@ def main():
             '; '.join(door_reasons) if door_reasons else ''  # Reasons (semicolon-separated)
         ])
         # Enable text wrapping for IDs and reasons columns
-        ws['D8'].alignment = Alignment(wrap_text=True, vertical='top')
-        ws['E8'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws['D8'].alignment = wrap_top
+        ws['E8'].alignment = wrap_top
 
         # Row 9: Corridors compliance data
         corridor_fail_ids = []
@@ -1127,8 +1531,8 @@ def main():
             '\n'.join(corridor_fail_ids) if corridor_fail_ids else '',  # Failing IDs (vertical list)
             '\n'.join(corridor_reasons) if corridor_reasons else ''  # Reasons (vertical list with newlines)
         ])
-        ws['D9'].alignment = Alignment(wrap_text=True, vertical='top')
-        ws['E9'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws['D9'].alignment = wrap_top
+        ws['E9'].alignment = wrap_top
 
         # Row 10: Stairs (width) compliance data
         stair_fail_ids = []
@@ -1136,7 +1540,7 @@ def main():
         for s in failing_stairs:
             # Stair ID not parsed; leave blank or parse from name if pattern exists
             stair_fail_ids.append('')
-            stair_reasons.append('; '.join(s.get('issues', [])))
+            stair_reasons.append('; '.join(s.issues))
         ws.append([
             'Stairs (width)',
             (len(stairs) - len(failing_stairs)),
@@ -1144,8 +1548,8 @@ def main():
             '\n'.join(stair_fail_ids) if stair_fail_ids else '',
             '; '.join(stair_reasons) if stair_reasons else ''
         ])
-        ws['D10'].alignment = Alignment(wrap_text=True, vertical='top')
-        ws['E10'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws['D10'].alignment = wrap_top
+        ws['E10'].alignment = wrap_top
 
         # Row 11: Stair flights enclosure compliance data
         failing_flights = [f for f in flight_4wall if not f.get('fully_enclosed')]
@@ -1177,8 +1581,8 @@ def main():
             '\n'.join(flight_fail_ids) if flight_fail_ids else '',  # Failing IDs (vertical list)
             '\n'.join(flight_reasons) if flight_reasons else ''  # Reasons (vertical list)
         ])
-        ws['D11'].alignment = Alignment(wrap_text=True, vertical='top')
-        ws['E11'].alignment = Alignment(wrap_text=True, vertical='top')
+        ws['D11'].alignment = wrap_top
+        ws['E11'].alignment = wrap_top
 
         # Auto-size columns for optimal readability
         widths = {'A': 32, 'B': 16, 'C': 16, 'D': 36, 'E': 48}
@@ -1208,8 +1612,10 @@ def main():
         # Output: Two lines only
         # Line 1: Message + clickable file path
         # Line 2: Explicit "Click:"  instruction + clickable link text
-        print("Results of the evacuation check:", _osc8_link(xlsx_url, xlsx_path))
-        print("Click:", _osc8_link(xlsx_url, "Open Excel (.xlsx)"))
+        sys.stdout.write(
+            f"Results of the evacuation check: {_osc8_link(xlsx_url, xlsx_path)}\n"
+            f"Click: {_osc8_link(xlsx_url, 'Open Excel (.xlsx)')}\n"
+        )
     except Exception as e:
         print(f"Error: Could not generate Excel file. {e}")
 
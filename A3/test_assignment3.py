@@ -0,0 +1,93 @@
+"""Regression tests for Assignment3's compliance rules."""
+import gc
+
+import ifcopenshell
+import pytest
+
+import Assignment3 as A
+
+
+def _flight_with_profile(xdim, ydim):
+    """In-memory IfcStairFlight whose Body is one extruded IfcRectangleProfileDef.
+
+    Returns (file, flight): the file must stay referenced while the flight is used.
+    """
+    f = ifcopenshell.file(schema='IFC4')
+    origin = f.createIfcAxis2Placement3D(f.createIfcCartesianPoint((0.0, 0.0, 0.0)))
+    ctx = f.createIfcGeometricRepresentationContext(None, 'Model', 3, 1.0e-5, origin)
+    prof = f.createIfcRectangleProfileDef('AREA', None, None, xdim, ydim)
+    solid = f.createIfcExtrudedAreaSolid(prof, origin, f.createIfcDirection((0.0, 0.0, 1.0)), 3000.0)
+    body = f.createIfcShapeRepresentation(ctx, 'Body', 'SweptSolid', [solid])
+    shape = f.createIfcProductDefinitionShape(None, None, [body])
+    return f, f.createIfcStairFlight(ifcopenshell.guid.new(), None, 'Stair:1 Run 1', Representation=shape)
+
+
+@pytest.mark.parametrize('xdim, ydim', [(1200.0, 90.0), (1.2, 0.09)])
+def test_stair_profile_width_scales_both_axes_together(xdim, ydim):
+    # Mixed-magnitude profile: one unit factor for the whole profile, so the
+    # 90mm side is not read as 90 m (the old per-axis rule reported 90000mm).
+    f, flight = _flight_with_profile(xdim, ydim)
+    result = A.analyze_stair(flight)
+    assert result.width_mm == pytest.approx(1200.0)
+    assert not result.has_issues
+
+
+def _flight_with_width_pset(width):
+    """In-memory IfcStairFlight whose only width is a 'Width' property in a pset.
+
+    The pset is always STEP id 2, so two such files share their property ids.
+    Returns (file, flight) like _flight_with_profile.
+    """
+    f = ifcopenshell.file(schema='IFC4')
+    prop = f.createIfcPropertySingleValue('Width', None, f.createIfcPositiveLengthMeasure(width), None)
+    pset = f.createIfcPropertySet(ifcopenshell.guid.new(), None, 'Pset_StairFlightCommon', None, [prop])
+    flight = f.createIfcStairFlight(ifcopenshell.guid.new(), None, 'Stair:1 Run 1')
+    f.createIfcRelDefinesByProperties(ifcopenshell.guid.new(), None, None, None, [flight], pset)
+    return f, flight
+
+
+def test_pset_width_is_read_per_model():
+    # Same STEP id for the pset in both files: the second model must not get
+    # the first model's flattened properties back.
+    f1, wide = _flight_with_width_pset(1200.0)
+    f2, narrow = _flight_with_width_pset(700.0)
+    assert wide.IsDefinedBy[0].RelatingPropertyDefinition.id() == narrow.IsDefinedBy[0].RelatingPropertyDefinition.id()
+    first = A.analyze_stair(wide)
+    second = A.analyze_stair(narrow)
+    assert first.width_mm == pytest.approx(1200.0)
+    assert not first.has_issues
+    assert second.width_mm == pytest.approx(700.0)
+    assert second.has_issues
+
+
+def test_entity_caches_are_per_model():
+    # Same GlobalId and same STEP ids in both files: the entity caches must keep
+    # the two models apart.
+    f1, wide = _flight_with_width_pset(1200.0)
+    f2, narrow = _flight_with_width_pset(700.0)
+    narrow.GlobalId = wide.GlobalId
+    for f in (f1, f2):
+        A._by_type(f, 'IfcStairFlight')  # registers the model with the caches
+    assert A.get_numeric(wide, A.STAIR_WIDTH_NAMES) == pytest.approx(1200.0)
+    assert A.get_numeric(narrow, A.STAIR_WIDTH_NAMES) == pytest.approx(700.0)
+
+
+def test_freed_model_drops_its_cache_entries():
+    f, flight = _flight_with_width_pset(1200.0)
+    ptr = A._register_model(f)
+    A.get_numeric(flight, A.STAIR_WIDTH_NAMES)
+    assert any(k[0] == ptr for k in A._NUMERIC_CACHE)
+    del f, flight
+    gc.collect()
+    assert ptr not in A._MODELS
+    for cache in (A._NUMERIC_CACHE, A._PSET_CACHE, A._PDEF_ITEMS):
+        assert not any(k[0] == ptr for k in cache)
+
+
+def test_direct_attrs_follow_the_schema():
+    # IfcStairFlight's riser count is NumberOfRiser in IFC2X3 but NumberOfRisers in IFC4
+    names = ('numberofriser', 'numberofrisers')
+    files = [ifcopenshell.file(schema=schema) for schema in ('IFC2X3', 'IFC4')]
+    flights = [f.createIfcStairFlight(ifcopenshell.guid.new()) for f in files]
+    assert A._direct_attrs(flights[0], names, frozenset(names)) == ('NumberOfRiser',)
+    assert A._direct_attrs(flights[1], names, frozenset(names)) == ('NumberOfRisers',)